@@ -1,8 +1,8 @@
 import argparse
+import functools
+import os
 import sys
-import csv
-import re
-import configparser
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 try:
@@ -20,15 +20,10 @@ except ImportError:
             yield item
         print()
 
-from processors.identifier import LanguageIdentifier
-from processors.translator import LindatTranslator
-from utils import process_alto_xml, process_amcr_xml
-import requests
-import tempfile
-
-
 def fetch_xml_from_url(url, download_dir):
     """Downloads an XML file from a URL to a local directory."""
+    import requests
+
     try:
         response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
         response.raise_for_status()
@@ -53,21 +48,21 @@ def parse_arguments():
     parser.add_argument("--target_lang", "-tgt", type=str, default="en")
     parser.add_argument("--config", "-c", type=Path, default=Path("config.txt"))
     parser.add_argument("--alto", action="store_true")
+    parser.add_argument("--fast_langid", action="store_true")
     parser.add_argument("--xpaths", type=Path, default=None)
     parser.add_argument("--xsd", type=str, default=None)
 
     args = parser.parse_args()
 
     if args.config and args.config.exists():
-        config = configparser.ConfigParser()
-        with open(args.config, 'r', encoding='utf-8') as f:
-            cleaned_lines = ['[DEFAULT]\n']
-            for line in f:
-                cleaned_line = re.sub(r'^\[.*?\]\s*', '', line.strip())
-                if cleaned_line and not cleaned_line.startswith('#'):
-                    cleaned_lines.append(cleaned_line + '\n')
-
-        config.read_string(''.join(cleaned_lines))
+        import configparser
+        import re
+
+        config = configparser.ConfigParser(comment_prefixes=('#',), inline_comment_prefixes=('#',))
+        text = args.config.read_text(encoding='utf-8')
+        # Strip [section] tags in one C-level pass; comments are handled
+        # natively by configparser
+        config.read_string('[DEFAULT]\n' + re.sub(r'^\s*\[.*?\]\s*', '', text, flags=re.MULTILINE))
         defaults = config['DEFAULT']
 
         if 'input_path' in defaults: args.input_path = Path(defaults['input_path'])
@@ -94,6 +89,59 @@ def generate_output_path(input_file, base_output, args, is_batch=False):
     return input_file.with_name(new_filename)
 
 
+@functools.lru_cache(maxsize=1)
+def _get_translator():
+    """One translator (and its session/cache) per process, built on first use."""
+    from processors.translator import LindatTranslator
+    from processors.cache import TranslationCache
+    return LindatTranslator(cache=TranslationCache())
+
+
+@functools.lru_cache(maxsize=1)
+def _get_identifier(backend):
+    """One language-ID model per process; avoids reloading it per file."""
+    from processors.identifier import LanguageIdentifier
+    return LanguageIdentifier(backend=backend)
+
+
+def _process_one(file_path, out_dir, args, xpaths_list, is_batch):
+    """Processes a single XML file; safe to run inside a worker process."""
+    # Heavy imports stay out of module scope so --help and argparse
+    # errors return instantly
+    import csv
+
+    from utils import process_alto_xml, process_amcr_xml
+
+    translator = _get_translator()
+    # Initialize the language identifier ONLY if 'auto' is selected to save memory
+    identifier = None
+    if args.source_lang == "auto":
+        identifier = _get_identifier("fast" if args.fast_langid else "fasttext")
+
+    output_file = generate_output_path(file_path, out_dir, args, is_batch=is_batch)
+
+    csv_path = output_file.with_name(f"{file_path.name.partition('.')[0]}_log.csv")
+    # Large buffer: row writes stay in memory instead of per-row syscalls
+    with open(csv_path, "w", encoding="utf-8", newline="", buffering=1 << 20) as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(
+            ["file", "page_num", "line_num", f"text_{args.source_lang}", f"text_{args.target_lang}"])
+
+        # Dispatch table keeps main() agnostic of extraction backends;
+        # new modes only need an entry here
+        handlers = {'alto': process_alto_xml, 'amcr': process_amcr_xml}
+        mode = 'alto' if args.alto else 'amcr'
+        extra = {} if mode == 'alto' else {'xpaths': xpaths_list, 'xsd_url': args.xsd}
+        try:
+            handlers[mode](file_path, output_file, translator=translator,
+                           src_lang=args.source_lang, tgt_lang=args.target_lang,
+                           csv_writer=csv_writer, identifier=identifier, **extra)
+        finally:
+            # Persist the tail of the cache's commit batch after each file
+            if translator.cache:
+                translator.cache.commit()
+
+
 def main():
     args = parse_arguments()
 
@@ -108,11 +156,6 @@ def main():
         print("[ERROR] Specify either the --alto flag or provide --xpaths file in config.")
         return
 
-    translator = LindatTranslator()
-
-    # Initialize FastText Identifier ONLY if 'auto' is selected to save memory
-    identifier = LanguageIdentifier() if args.source_lang == "auto" else None
-
     xpaths_list = []
     if args.xpaths and args.xpaths.exists():
         with open(args.xpaths, 'r', encoding='utf-8') as f:
@@ -147,23 +190,42 @@ def main():
     out_dir = args.output if args.output else input_path.parent / f"translated_{args.target_lang}"
     if input_path.is_dir(): out_dir.mkdir(parents=True, exist_ok=True)
 
-    for i, file_path in enumerate(files_to_process, 1):
-        print(f"\n[FILE {i}/{len(files_to_process)}] Processing: {file_path.name}")
-        output_file = generate_output_path(file_path, out_dir, args, is_batch=input_path.is_dir())
+    is_batch = input_path.is_dir()
+
+    if args.source_lang != "auto" and args.source_lang == args.target_lang:
+        # Nothing to translate - mirror the inputs under their output names
+        import shutil
 
-        csv_path = output_file.with_name(f"{file_path.name.split('.')[0]}_log.csv")
-        with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
-            csv_writer = csv.writer(csv_file)
-            csv_writer.writerow(
-                ["file", "page_num", "line_num", f"text_{args.source_lang}", f"text_{args.target_lang}"])
+        for file_path in files_to_process:
+            output_file = generate_output_path(file_path, out_dir, args, is_batch=is_batch)
+            shutil.copyfile(file_path, output_file)
+            print(f"[INFO] Source equals target language. Copied: {output_file.name}")
+        print(f"\n{'=' * 60}\n PROCESSING COMPLETE ".center(60, "=") + f"\n{'=' * 60}\n")
+        return
 
+    if len(files_to_process) > 1:
+        # Longest-processing-time-first scheduling: dispatch big files first
+        # so no worker is stuck finishing a large file at the tail
+        files_to_process.sort(key=lambda p: p.stat().st_size, reverse=True)
+
+        # Independent files: parse/serialize in parallel worker processes
+        max_workers = min(len(files_to_process), os.cpu_count() or 1, 8)
+        print(f"[INFO] Processing {len(files_to_process)} files with {max_workers} workers...")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_process_one, fp, out_dir, args, xpaths_list, is_batch): fp
+                       for fp in files_to_process}
+            for i, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                try:
+                    future.result()
+                    print(f"[FILE {i}/{len(files_to_process)}] Done: {file_path.name}")
+                except Exception as e:
+                    print(f"[ERROR] Failed processing {file_path.name}: {e}")
+    else:
+        for i, file_path in enumerate(files_to_process, 1):
+            print(f"\n[FILE {i}/{len(files_to_process)}] Processing: {file_path.name}")
             try:
-                if args.alto:
-                    process_alto_xml(file_path, output_file, translator, args.source_lang, args.target_lang, csv_writer,
-                                     identifier)
-                else:
-                    process_amcr_xml(file_path, output_file, xpaths_list, translator, args.source_lang,
-                                     args.target_lang, args.xsd, csv_writer, identifier)
+                _process_one(file_path, out_dir, args, xpaths_list, is_batch)
             except Exception as e:
                 print(f"[ERROR] Failed processing {file_path.name}: {e}")
 
@@ -0,0 +1,74 @@
+import atexit
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class TranslationCache:
+    """
+    Persistent on-disk cache of translations keyed by (src, tgt, text).
+    Re-runs over the same corpus are served from disk instead of re-paying
+    the Lindat API cost for every string.
+    """
+
+    COMMIT_EVERY = 32  # Batch-commit inserts to avoid per-row fsync
+
+    def __init__(self, path="~/.atrium_cache.sqlite"):
+        self.path = Path(path).expanduser()
+        # Concurrent translation requests share one connection behind a lock
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            # WAL lets concurrent batch jobs share one cache file safely
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.commit()
+        except Exception as e:
+            print(f"[WARN] Translation cache unavailable ({e}). Running without it.")
+            self._conn = None
+        self._pending = 0
+        # Flush the tail of the commit batch on interpreter exit; otherwise
+        # the open transaction is rolled back and its rows are lost
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(text, src_lang, tgt_lang):
+        return hashlib.sha1(f"{src_lang}|{tgt_lang}|{text}".encode('utf-8')).hexdigest()
+
+    def get(self, text, src_lang, tgt_lang):
+        """Returns the cached translation, or None on a miss."""
+        if not self._conn:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM translations WHERE key = ?",
+                (self.make_key(text, src_lang, tgt_lang),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, text, src_lang, tgt_lang, translation):
+        if not self._conn:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?)",
+                (self.make_key(text, src_lang, tgt_lang), translation))
+            self._pending += 1
+            flush = self._pending >= self.COMMIT_EVERY
+        if flush:
+            self.commit()
+
+    def commit(self):
+        if self._conn:
+            with self._lock:
+                self._conn.commit()
+                self._pending = 0
+        else:
+            self._pending = 0
+
+    def close(self):
+        if self._conn:
+            self.commit()
+            self._conn.close()
+            self._conn = None
@@ -1,5 +1,8 @@
-import fasttext
-from huggingface_hub import hf_hub_download
+from collections import Counter, OrderedDict
+from functools import cached_property
+
+# C-level newline flattening for single-sample prediction
+_NEWLINE_TABLE = str.maketrans('\n', ' ')
 
 
 class LanguageIdentifier:
@@ -12,42 +15,99 @@ class LanguageIdentifier:
         'spa': 'es', 'ita': 'it', 'nld': 'nl', 'hin': 'hi'
     }
 
-    def __init__(self):
+    def __init__(self, backend="fasttext"):
         """
-        Initializes the LanguageIdentifier by downloading and loading
-        the FastText language identification model from Hugging Face Hub.
+        Initializes the LanguageIdentifier. The default backend downloads and
+        loads the FastText language identification model from Hugging Face
+        Hub; backend="fast" uses the much lighter CLD3 identifier (gcld3)
+        when installed, which avoids the ~125 MB model load. The model itself
+        is loaded lazily on the first detect() call.
         """
+        self.backend = backend
+        # OCR lines repeat heavily; remember the verdict per unique text
+        self._memo = OrderedDict()
+
+    MEMO_MAXSIZE = 20000
+
+    @cached_property
+    def model(self):
+        if self.backend == "fast":
+            try:
+                import gcld3
+                return gcld3.NNetLanguageIdentifier(min_num_bytes=0, max_num_bytes=2000)
+            except ImportError:
+                print("[WARN] gcld3 is not installed. Falling back to FastText.")
+                self.backend = "fasttext"
+
         try:
+            # Imported here so the CLI starts fast when detection is unused
+            import fasttext
+            from huggingface_hub import hf_hub_download
+
             model_path = hf_hub_download(repo_id="facebook/fasttext-language-identification", filename="model.bin")
-            self.model = fasttext.load_model(model_path)
+            return fasttext.load_model(model_path)
         except Exception as e:
             print(f"[ERROR] Failed to load FastText language model: {type(e).__name__} - {e}")
-            self.model = None
+            return None
 
     def detect(self, text):
         """
-        Detects the language of the provided text. Normalizes text structure,
-        queries the FastText model, and maps the ISO 639-3 result to ISO 639-1.
+        Detects the language of the provided text. Results are memoized per
+        unique text, so duplicate lines skip model inference entirely.
         Returns a tuple: (language_code, confidence_score).
         """
-        if not self.model:
-            print("[WARN] Language identification model is not loaded. Defaulting to 'en'.")
+        if not text or not text.strip():
             return 'en', 0.0
 
-        if not text or not text.strip():
+        result = self._memo.get(text)
+        if result is not None:
+            self._memo.move_to_end(text)
+            return result
+
+        result = self._detect_uncached(text)
+        self._memo[text] = result
+        if len(self._memo) > self.MEMO_MAXSIZE:
+            self._memo.popitem(last=False)
+        return result
+
+    def _detect_uncached(self, text):
+        """
+        Normalizes text structure, queries the detection model, and maps the
+        ISO 639-3 result to ISO 639-1.
+        """
+        if not self.model:
+            print("[WARN] Language identification model is not loaded. Defaulting to 'en'.")
             return 'en', 0.0
 
         # Lowercase for better detection
-        clean_text = text.replace('\n', ' ').lower()[:2000]
+        clean_text = text.translate(_NEWLINE_TABLE).lower()[:2000]
+
+        if self.backend == "fast":
+            try:
+                result = self.model.FindLanguage(text=clean_text)
+                # CLD3 already reports ISO 639-1 style codes (e.g. 'cs')
+                return result.language.split('-')[0], result.probability
+            except Exception as e:
+                print(f"[ERROR] Language detection prediction failed: {type(e).__name__} - {e}")
+                return 'en', 0.0
 
         try:
-            labels, scores = self.model.predict(clean_text)
+            # Multi-line documents: predict per line (FastText's recommended
+            # one-sample-per-line batching) and majority-vote the result,
+            # which is robust on mixed-language text
+            lines = [line.strip().lower() for line in text.splitlines() if len(line.strip()) > 20][:32]
+            if len(lines) > 1:
+                labels, scores = self.model.predict(lines, k=1)
+                votes = Counter(line_labels[0] for line_labels in labels)
+                raw_label, count = votes.most_common(1)[0]
+                score = sum(s[0] for l, s in zip(labels, scores) if l[0] == raw_label) / count
+            else:
+                labels, scores = self.model.predict(clean_text)
+                raw_label = labels[0]
+                score = scores[0]
 
-            raw_label = labels[0].replace("__label__", "")
-            iso3_code = raw_label.split('_')[0]
+            iso3_code = raw_label.replace("__label__", "").split('_')[0]
             lang_code = self.CODE_MAP.get(iso3_code, iso3_code)
-
-            score = scores[0]
             return lang_code, score
         except Exception as e:
             print(f"[ERROR] Language detection prediction failed: {type(e).__name__} - {e}")
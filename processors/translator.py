@@ -1,85 +1,383 @@
-import requests
+import json
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
 
-try:
-    from tqdm import tqdm
-except ImportError:
-    def tqdm(iterable, *args, **kwargs):
-        for item in iterable:
-            yield item
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class LindatTranslator:
     BASE_URL = "https://lindat.mff.cuni.cz/services/translation/api/v2"
 
-    def __init__(self):
-        self.supported_models = self._fetch_models()
+    # Delimiter used to pack several short texts into one API call.
+    # Chosen so the MT engine passes it through untouched; the tolerant
+    # regex below absorbs whitespace the engine may add around it.
+    SEPARATOR = "\n=====\n"
+    _SEPARATOR_RE = re.compile(r"\s*={5}\s*")
+
+    # Bound on the in-memory (src, tgt, text) -> translation memo; OCR and
+    # metadata corpora repeat headers and field values heavily
+    MEMO_MAXSIZE = 50000
+
+    def __init__(self, cache=None):
+        # Keep-alive session: reuse TCP+TLS connections across all API calls
+        # instead of paying a handshake per translated string
+        self.session = requests.Session()
+        self.session.headers.update({'Connection': 'keep-alive',
+                                     'User-Agent': 'atrium-translator'})
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64,
+                              max_retries=Retry(total=3, backoff_factor=0.3,
+                                                status_forcelist=[502, 503, 504]))
+        self.session.mount('https://', adapter)
+
+        self.cache = cache
+        # LRU in front of the persistent cache: duplicate strings within a
+        # run never pay the sqlite lookup, let alone the POST
+        self._memo = OrderedDict()
+
+    def _memo_get(self, text, src_lang, tgt_lang):
+        key = (src_lang, tgt_lang, text)
+        result = self._memo.get(key)
+        if result is not None:
+            self._memo.move_to_end(key)
+        return result
+
+    def _memo_put(self, text, src_lang, tgt_lang, result):
+        self._memo[(src_lang, tgt_lang, text)] = result
+        self._memo.move_to_end((src_lang, tgt_lang, text))
+        if len(self._memo) > self.MEMO_MAXSIZE:
+            self._memo.popitem(last=False)
+
+    # Model list rarely changes; keep it on disk for a day to skip the
+    # startup round-trip
+    MODELS_CACHE = Path("~/.cache/atrium/lindat_models.json")
+    MODELS_CACHE_TTL = 24 * 3600
+
+    @cached_property
+    def supported_models(self):
+        """Fetched lazily on the first translation, then memoized."""
+        return self._fetch_models()
 
     def _fetch_models(self):
+        cache_path = self.MODELS_CACHE.expanduser()
+        try:
+            if cache_path.exists() and time.time() - cache_path.stat().st_mtime < self.MODELS_CACHE_TTL:
+                return frozenset(json.loads(cache_path.read_text(encoding='utf-8')))
+        except Exception:
+            pass  # Unreadable cache - fall through to the network
+
         try:
-            resp = requests.get(f"{self.BASE_URL}/models")
+            resp = self.session.get(f"{self.BASE_URL}/models", timeout=(5, 30))
             resp.raise_for_status()
             data = resp.json()
 
             if isinstance(data, dict) and '_embedded' in data:
-                return [item['model'] for item in data['_embedded'].get('item', [])]
+                models = [item['model'] for item in data['_embedded'].get('item', [])]
             elif isinstance(data, list):
-                return data
-            return []
+                models = data
+            else:
+                models = []
+
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                cache_path.write_text(json.dumps(models), encoding='utf-8')
+            except Exception:
+                pass  # Cache write is best-effort
+            return frozenset(models)
         except Exception as e:
             print(f"[WARN] Network error fetching models ({e}). Using default list.")
-            return ["fr-en", "cs-en", "de-en", "uk-en", "ru-en", "pl-en"]
+            return frozenset(["fr-en", "cs-en", "de-en", "uk-en", "ru-en", "pl-en"])
+
+    def close(self):
+        """Releases the pooled HTTP connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _resolve_model(self, src_lang, tgt_lang):
+        """Maps a language pair to an available model, defaulting to cs-en."""
+        model_name = f"{src_lang}-{tgt_lang}"
+        if self.supported_models and model_name not in self.supported_models:
+            return "cs-en", "cs", "en"
+        return model_name, src_lang, tgt_lang
 
     def translate(self, text, src_lang, tgt_lang="en"):
         if not text or not text.strip() or src_lang == tgt_lang:
             return text
 
-        model_name = f"{src_lang}-{tgt_lang}"
+        memoized = self._memo_get(text, src_lang, tgt_lang)
+        if memoized is not None:
+            return memoized
 
-        if self.supported_models and model_name not in self.supported_models:
-            model_name = f"cs-en"
-            src_lang = "cs"
-            tgt_lang = "en"
+        if self.cache:
+            cached = self.cache.get(text, src_lang, tgt_lang)
+            if cached is not None:
+                self._memo_put(text, src_lang, tgt_lang, cached)
+                return cached
 
+        # Keep the resolved pair separate: the memo and cache must be keyed
+        # on what the caller asked for, or fallback pairs never hit
+        model_name, model_src, model_tgt = self._resolve_model(src_lang, tgt_lang)
 
         chunks = self._chunk_text(text)
-        translated_chunks = []
-        chunk_iter = tqdm(chunks, desc="Translating chunks", leave=False) if len(chunks) > 1 else chunks
+        if len(chunks) > 1:
+            # Long documents: fire the chunk requests concurrently
+            translated_chunks = self._post_chunks_concurrent(chunks, model_name, model_src, model_tgt)
+        else:
+            translated_chunks = [self._post_chunk(chunk, model_name, model_src, model_tgt)
+                                 for chunk in chunks]
 
-        for chunk in chunk_iter:
-            try:
-                response = requests.post(
-                    f"{self.BASE_URL}/models/{model_name}?src={src_lang}&tgt={tgt_lang}",
-                    data={"input_text": chunk}
-                )
+        result = "\n".join(translated_chunks)
+        if "[Translation Failed" not in result and "[Network Error" not in result:
+            self._memo_put(text, src_lang, tgt_lang, result)
+            if self.cache:
+                self.cache.put(text, src_lang, tgt_lang, result)
+        return result
+
+    def translate_batch(self, texts, src_lang, tgt_lang="en", max_chars=4000, max_workers=8):
+        """
+        Translates a list of short texts, packing as many as fit into a single
+        API call to amortize the per-request overhead. The packed requests are
+        issued concurrently (the work is pure I/O wait), sharing the pooled
+        session. Returns a list of translations aligned with the input. Falls
+        back to per-text calls if the delimiter does not survive translation.
+        """
+        results = [None] * len(texts)
+
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or not text.strip() or src_lang == tgt_lang:
+                results[i] = text
+                continue
+            memoized = self._memo_get(text, src_lang, tgt_lang)
+            if memoized is not None:
+                results[i] = memoized
+                continue
+            if self.cache:
+                cached = self.cache.get(text, src_lang, tgt_lang)
+                if cached is not None:
+                    self._memo_put(text, src_lang, tgt_lang, cached)
+                    results[i] = cached
+                    continue
+            pending.append((i, text))
+
+        # Sort by length so each packed request holds similarly sized texts;
+        # the backend's decoding cost tracks the longest item in a batch
+        pending.sort(key=lambda item: len(item[1]))
+
+        groups = []  # each entry: (indices into texts, texts packed into one call)
+        group_idx, group = [], []
+        for i, text in pending:
+            if len(text) >= max_chars:
+                # Too long to pack - let translate() chunk it on its own
+                groups.append(([i], [text]))
+                continue
+            packed_len = sum(len(t) for t in group) + len(self.SEPARATOR) * len(group)
+            if group and packed_len + len(text) > max_chars:
+                groups.append((group_idx, group))
+                group_idx, group = [], []
+            group_idx.append(i)
+            group.append(text)
+        if group:
+            groups.append((group_idx, group))
+
+        def translate_group(items):
+            if len(items) == 1:
+                return [self.translate(items[0], src_lang, tgt_lang)]
+            joined = self.SEPARATOR.join(items)
+            translated = self.translate(joined, src_lang, tgt_lang)
+            parts = [p.strip() for p in self._SEPARATOR_RE.split(translated)]
+            if len(parts) != len(items):
+                # Delimiter was mangled by the MT engine - translate one by one
+                parts = [self.translate(t, src_lang, tgt_lang) for t in items]
+            return parts
+
+        if len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+                translated_groups = list(executor.map(translate_group, [g[1] for g in groups]))
+        else:
+            translated_groups = [translate_group(items) for _, items in groups]
 
+        for (indices, _), parts in zip(groups, translated_groups):
+            for idx, part in zip(indices, parts):
+                results[idx] = part
+                if "[Translation Failed" not in part and "[Network Error" not in part:
+                    self._memo_put(texts[idx], src_lang, tgt_lang, part)
+                    if self.cache:
+                        self.cache.put(texts[idx], src_lang, tgt_lang, part)
+
+        return results
+
+    def _post_chunk(self, chunk, model_name, src_lang, tgt_lang):
+        """Sends one chunk through the pooled session and returns the text."""
+        try:
+            with self.session.post(
+                f"{self.BASE_URL}/models/{model_name}?src={src_lang}&tgt={tgt_lang}",
+                data={"input_text": chunk},
+                timeout=(5, 60),
+                stream=True
+            ) as response:
                 if response.status_code == 200:
-                    response.encoding = 'utf-8'
-                    translated_chunks.append(response.text.strip())
-                else:
-                    error_msg = f"[Translation Failed: HTTP {response.status_code}]"
-                    print(error_msg)
-                    translated_chunks.append(error_msg)
-            except requests.exceptions.RequestException as e:
-                error_msg = f"[Network Error: {e}]"
+                    # The API always answers UTF-8; stream the raw bytes into
+                    # one buffer and skip requests' charset detection machinery
+                    buf = bytearray()
+                    for block in response.iter_content(chunk_size=65536):
+                        buf += block
+                    return buf.decode('utf-8', errors='replace').strip()
+                error_msg = f"[Translation Failed: HTTP {response.status_code}]"
                 print(error_msg)
-                translated_chunks.append(error_msg)
+                return error_msg
+        except requests.exceptions.RequestException as e:
+            error_msg = f"[Network Error: {e}]"
+            print(error_msg)
+            return error_msg
+
+    def _post_chunks_concurrent(self, chunks, model_name, src_lang, tgt_lang, concurrency=8):
+        """Posts many chunks with up to `concurrency` in flight, in order."""
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as executor:
+                return list(executor.map(
+                    lambda chunk: self._post_chunk(chunk, model_name, src_lang, tgt_lang), chunks))
 
-        return "\n".join(translated_chunks)
+        import asyncio
 
-    def _chunk_text(self, text, chunk_size=4000):
+        return asyncio.run(self._post_chunks_async(chunks, model_name, src_lang, tgt_lang, concurrency))
+
+    async def _post_chunks_async(self, chunks, model_name, src_lang, tgt_lang, concurrency):
+        import asyncio
+
+        import aiohttp
+
+        url = f"{self.BASE_URL}/models/{model_name}?src={src_lang}&tgt={tgt_lang}"
+        sem = asyncio.Semaphore(concurrency)
+
+        async def post(session, chunk):
+            async with sem:
+                try:
+                    async with session.post(url, data={"input_text": chunk}) as resp:
+                        if resp.status == 200:
+                            return (await resp.text(encoding='utf-8')).strip()
+                        error_msg = f"[Translation Failed: HTTP {resp.status}]"
+                        print(error_msg)
+                        return error_msg
+                except aiohttp.ClientError as e:
+                    error_msg = f"[Network Error: {e}]"
+                    print(error_msg)
+                    return error_msg
+
+        connector = aiohttp.TCPConnector(limit=concurrency * 2, keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return list(await asyncio.gather(*[post(session, chunk) for chunk in chunks]))
+
+    def translate_many(self, texts, src_lang, tgt_lang="en", concurrency=8):
         """
-        Smart chunking that respects word boundaries by breaking at the nearest space.
+        Translates each text as its own request with up to `concurrency` in
+        flight at once via aiohttp. Falls back to the thread-pooled
+        translate_batch when aiohttp is unavailable. Returns translations
+        aligned with the input.
         """
-        chunks = []
-        while len(text) > chunk_size:
-            split_idx = text.rfind(' ', 0, chunk_size)
-            if split_idx == -1:
-                split_idx = chunk_size  # Force split if no spaces exist (rare)
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            return self.translate_batch(texts, src_lang, tgt_lang, max_workers=concurrency)
+
+        import asyncio
+
+        return asyncio.run(self._translate_many_async(texts, src_lang, tgt_lang, concurrency))
+
+    async def _translate_many_async(self, texts, src_lang, tgt_lang, concurrency):
+        import asyncio
+
+        import aiohttp
+
+        results = [None] * len(texts)
+        model_name, model_src, model_tgt = self._resolve_model(src_lang, tgt_lang)
+        url = f"{self.BASE_URL}/models/{model_name}?src={model_src}&tgt={model_tgt}"
+        sem = asyncio.Semaphore(concurrency)
+
+        async def worker(session, i, text):
+            parts = []
+            for chunk in self._chunk_text(text):
+                async with sem:
+                    try:
+                        async with session.post(url, data={"input_text": chunk}) as resp:
+                            if resp.status == 200:
+                                parts.append((await resp.text(encoding='utf-8')).strip())
+                            else:
+                                error_msg = f"[Translation Failed: HTTP {resp.status}]"
+                                print(error_msg)
+                                parts.append(error_msg)
+                    except aiohttp.ClientError as e:
+                        error_msg = f"[Network Error: {e}]"
+                        print(error_msg)
+                        parts.append(error_msg)
+            results[i] = "\n".join(parts)
 
-            chunks.append(text[:split_idx].strip())
-            text = text[split_idx:].strip()
+        connector = aiohttp.TCPConnector(limit=concurrency * 2, keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = []
+            translated_idx = []
+            for i, text in enumerate(texts):
+                if not text or not text.strip() or src_lang == tgt_lang:
+                    results[i] = text
+                    continue
+                if self.cache:
+                    cached = self.cache.get(text, src_lang, tgt_lang)
+                    if cached is not None:
+                        results[i] = cached
+                        continue
+                tasks.append(worker(session, i, text))
+                translated_idx.append(i)
+            await asyncio.gather(*tasks)
 
-        if text:
-            chunks.append(text)
+        if self.cache:
+            for i in translated_idx:
+                result = results[i]
+                if result and "[Translation Failed" not in result and "[Network Error" not in result:
+                    self.cache.put(texts[i], src_lang, tgt_lang, result)
 
+        return results
+
+    def _chunk_text(self, text, chunk_size=4000):
+        """
+        Splits long text preferring sentence boundaries ('. ', '! ', '? ',
+        newline) so the MT engine never has to decode half a sentence, which
+        inflates server-side compute and garbles the seam between chunks.
+        Falls back to the last whitespace, then to a hard cut.
+        """
+        if len(text) <= chunk_size:
+            return [text] if text.strip() else []
+
+        chunks = []
+        cursor, length = 0, len(text)
+        while cursor < length:
+            end = min(cursor + chunk_size, length)
+            if end < length:
+                split = max(text.rfind('. ', cursor, end),
+                            text.rfind('! ', cursor, end),
+                            text.rfind('? ', cursor, end),
+                            text.rfind('\n', cursor, end))
+                # Only honor a boundary in the back half of the window;
+                # otherwise chunks would degenerate on boundary-poor text
+                if split > cursor + chunk_size // 2:
+                    end = split + 1
+                else:
+                    whitespace = text.rfind(' ', cursor, end)
+                    if whitespace > cursor:
+                        end = whitespace
+            chunk = text[cursor:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            cursor = end
         return chunks
\ No newline at end of file
@@ -1,20 +1,59 @@
-import re
-import xml.etree.ElementTree as ET
+import functools
+from itertools import islice
 from lxml import etree
-import urllib.request
 import sys
 
+__all__ = ['validate_xml_with_xsd', 'process_amcr_xml', 'process_alto_xml']
+
+# Shared document parser: skip xml:id indexing, accept arbitrarily deep
+# or large ALTO/AMCR files
+_PARSER = etree.XMLParser(huge_tree=True, collect_ids=False)
+
+
+@functools.lru_cache(maxsize=128)
+def _compiled_xpath(expr, ns_items):
+    """
+    Compiles an XPath expression once and reuses it across every file and
+    page that shares the same namespace map (ns_items: sorted tuple of
+    (prefix, uri) pairs, hashable for the cache). smart_strings is off:
+    string results come back as plain str objects that do not pin the
+    source tree in memory.
+    """
+    return etree.XPath(expr, namespaces=dict(ns_items), smart_strings=False)
+
+
+@functools.lru_cache(maxsize=1)
+def _http_session():
+    """Pooled keep-alive session for schema downloads, built on first use."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@functools.lru_cache(maxsize=16)
+def _load_schema(xsd_url_or_path):
+    """
+    Fetches, parses and compiles an XSD once per unique location: schema
+    compilation (and the download for URLs) dominates validation cost in
+    batch runs. The compiled XMLSchema validates distinct trees safely.
+    """
+    if xsd_url_or_path.startswith('http'):
+        response = _http_session().get(xsd_url_or_path, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response.raise_for_status()
+        xmlschema_doc = etree.fromstring(response.content)
+    else:
+        xmlschema_doc = etree.parse(xsd_url_or_path)
+    return etree.XMLSchema(xmlschema_doc)
+
 
 def validate_xml_with_xsd(xml_tree, xsd_url_or_path):
     try:
-        if xsd_url_or_path.startswith('http'):
-            req = urllib.request.Request(xsd_url_or_path, headers={'User-Agent': 'Mozilla/5.0'})
-            with urllib.request.urlopen(req) as f:
-                xmlschema_doc = etree.parse(f)
-        else:
-            xmlschema_doc = etree.parse(xsd_url_or_path)
-
-        xmlschema = etree.XMLSchema(xmlschema_doc)
+        xmlschema = _load_schema(xsd_url_or_path)
         if xmlschema.validate(xml_tree):
             return True, ""
         else:
@@ -23,50 +62,99 @@ def validate_xml_with_xsd(xml_tree, xsd_url_or_path):
         return False, f"Validation script error: {str(e)}"
 
 
+def _strip_ns(root):
+    """Rewrites every tag to its local name and drops xmlns declarations."""
+    for elem in root.iter():
+        if isinstance(elem.tag, str) and elem.tag[0] == '{':
+            elem.tag = etree.QName(elem).localname
+    etree.cleanup_namespaces(root)
+
+
 def process_amcr_xml(input_path, output_path, xpaths, translator, src_lang, tgt_lang, xsd_url=None, csv_writer=None,
-                     identifier=None):
+                     identifier=None, pretty=False, strip_namespaces=False):
     try:
-        tree = etree.parse(str(input_path))
+        tree = etree.parse(str(input_path), _PARSER)
         root = tree.getroot()
 
-        # OAI-PMH FIX: Deep search for AMCR namespaces
-        xpath_ns = {}
-        for elem in root.iter():
-            for prefix, uri in elem.nsmap.items():
+        if strip_namespaces:
+            # One O(N) pass now beats per-lookup namespace matching later.
+            # Opt-in: the output serializes without xmlns declarations, which
+            # breaks XSD validation and namespace-aware consumers
+            _strip_ns(root)
+            xpaths = [xp.replace('amcr:', '').replace('oai:', '') for xp in xpaths]
+            xpath_ns = {}
+        else:
+            # OAI-PMH FIX: the AMCR namespace usually sits on a nested metadata
+            # element, not the envelope root. Check the root nsmap first, then
+            # one C-level namespace-axis query instead of a per-element Python walk
+            xpath_ns = {}
+            for prefix, uri in root.nsmap.items():
                 if uri and 'amcr' in uri:
                     xpath_ns['amcr'] = uri
                 if uri and 'OAI-PMH' in uri:
                     xpath_ns['oai'] = uri  # Capture OAI envelope namespace
-            if 'amcr' in xpath_ns and 'oai' in xpath_ns:
-                break
+            if 'amcr' not in xpath_ns or 'oai' not in xpath_ns:
+                for prefix, uri in root.xpath('//namespace::*'):
+                    if uri and 'amcr' in uri:
+                        xpath_ns.setdefault('amcr', uri)
+                    elif uri and 'OAI-PMH' in uri:
+                        xpath_ns.setdefault('oai', uri)
 
-        # Hard fallback if absolutely no namespace is explicitly found
-        if 'amcr' not in xpath_ns:
-            xpath_ns['amcr'] = "http://amcr.aiscr.cz/ns/amcr"
+            # Hard fallback if absolutely no namespace is explicitly found
+            if 'amcr' not in xpath_ns:
+                xpath_ns['amcr'] = "http://amcr.aiscr.cz/ns/amcr"
 
+        # Single pass: deduplicate while grouping element references by text,
+        # preserving document order for the batched API calls
+        groups = {}
+        ns_key = tuple(sorted(xpath_ns.items()))
         for xpath in xpaths:
             try:
-                elements = root.xpath(xpath, namespaces=xpath_ns)
+                elements = _compiled_xpath(xpath, ns_key)(root)
                 for elem in elements:
                     original_text = elem.text
                     if original_text and original_text.strip():
-                        # Determine actual source language
-                        actual_src_lang = src_lang
-                        if src_lang == "auto" and identifier:
-                            detected_lang, conf = identifier.detect(original_text)
-                            actual_src_lang = detected_lang if conf > 0.2 else "cs"
-                        elif src_lang == "auto":
-                            actual_src_lang = "cs"  # Fallback if identifier fails/is missing
-
-                        translated = translator.translate(original_text, actual_src_lang, tgt_lang)
-                        elem.text = translated
-
-                        if csv_writer:
-                            doc_name = input_path.name.split('.')[0]
-                            csv_writer.writerow([doc_name, "", xpath, original_text, translated])
-            except etree.XPathEvalError as e:
+                        groups.setdefault(original_text, []).append((elem, xpath))
+            except etree.XPathError as e:
                 print(f"[WARN] Invalid XPath expression '{xpath}': {e}")
 
+        # AMCR records are effectively monolingual: detect the language once
+        # on a ~1 KB sample of the collected texts instead of per element,
+        # dropping to per-text detection only when that verdict is shaky
+        doc_lang = src_lang
+        if src_lang == "auto":
+            doc_lang = "cs"  # Fallback if identifier fails/is missing
+            if identifier and groups:
+                sample_parts, sample_len = [], 0
+                for text in groups:
+                    sample_parts.append(text)
+                    sample_len += len(text) + 1
+                    if sample_len >= 1024:
+                        break
+                detected_lang, conf = identifier.detect("\n".join(sample_parts))
+                doc_lang = detected_lang if conf >= 0.5 else None
+
+        lang_groups = {}
+        for text in groups:
+            if doc_lang is not None:
+                actual_src_lang = doc_lang
+            else:
+                detected_lang, conf = identifier.detect(text)
+                actual_src_lang = detected_lang if conf > 0.2 else "cs"
+            lang_groups.setdefault(actual_src_lang, []).append(text)
+
+        doc_name = input_path.name.partition('.')[0]
+        csv_rows = []
+        for lang, texts in lang_groups.items():
+            translations = translator.translate_batch(texts, lang, tgt_lang)
+            for text, translated in zip(texts, translations):
+                for elem, xpath in groups[text]:
+                    elem.text = translated
+                    if csv_writer:
+                        csv_rows.append([doc_name, "", xpath, text, translated])
+        if csv_writer and csv_rows:
+            csv_writer.writerows(csv_rows)
+
         if xsd_url:
             print(f"[INFO] Validating {output_path.name} against XSD...")
             is_valid, error_log = validate_xml_with_xsd(tree, xsd_url)
@@ -75,66 +163,136 @@ def process_amcr_xml(input_path, output_path, xpaths, translator, src_lang, tgt_
             else:
                 print(f"[SUCCESS] XSD Validation passed for {output_path.name}")
 
-        tree.write(str(output_path), encoding='utf-8', xml_declaration=True, pretty_print=True)
+        # Machine-consumed output: pretty-printing costs CPU and inflates
+        # the file, so it is opt-in
+        tree.write(str(output_path), encoding='utf-8', xml_declaration=True, pretty_print=pretty)
         print(f"[SUCCESS] Saved AMCR translation to: {output_path}")
 
     except Exception as e:
         print(f"[ERROR] Failed to process AMCR XML {input_path}: {e}")
 
 
-def process_alto_xml(input_path, output_path, translator, src_lang, tgt_lang, csv_writer=None, identifier=None):
-    try:
-        tree = etree.parse(str(input_path))
-        root = tree.getroot()
-        nsmap = root.nsmap
-        ns = {'alto': nsmap[None]} if None in nsmap else nsmap
-        pages = root.xpath('//alto:Page', namespaces=ns) if 'alto' in ns else root.xpath('//Page')
+def _translate_alto_page(page, page_idx, ns, translator, src_lang, tgt_lang, csv_writer, identifier, doc_name):
+    """Translates every TextLine of a single ALTO Page element in place."""
+    # Known tags: lxml's C-level iter() beats the XPath engine here and
+    # avoids materializing intermediate result sets
+    line_tag = f"{{{ns['alto']}}}TextLine" if 'alto' in ns else 'TextLine'
+    string_tag = f"{{{ns['alto']}}}String" if 'alto' in ns else 'String'
+    text_lines = list(page.iter(line_tag))
+    total_lines = len(text_lines)
+    csv_rows = []
+
+    # Pass 1: gather line texts, their String elements and source language
+    line_meta = []  # (line_id, strings, line_text, actual_src_lang)
+    for line_idx, line in enumerate(text_lines, 1):
+        line_id = line.get('ID', str(line_idx))
+        strings = list(line.iter(string_tag))
+        if not strings:
+            continue
+
+        contents = [c for c in (s.get('CONTENT') for s in strings) if c]
+        line_text = " ".join(contents).strip()
+        if not line_text:
+            continue
+
+        # Language Identification
+        actual_src_lang = src_lang
+        if src_lang == "auto" and identifier:
+            detected_lang, _ = identifier.detect(line_text)
+            actual_src_lang = detected_lang
 
-        for page_idx, page in enumerate(pages, 1):
-            text_lines = page.xpath('.//alto:TextLine', namespaces=ns) if 'alto' in ns else page.xpath('.//TextLine')
-            total_lines = len(text_lines)
+        line_meta.append((line_id, strings, line_text, actual_src_lang))
 
-            for line_idx, line in enumerate(text_lines, 1):
-                sys.stdout.write(f"\r[INFO] Page {page_idx} | Processing text block: {line_idx}/{total_lines}")
-                sys.stdout.flush()
+    if line_meta:
+        sys.stdout.write(f"\r[INFO] Page {page_idx} | Translating {len(line_meta)}/{total_lines} text blocks")
+        sys.stdout.flush()
 
-                line_id = line.get('ID', str(line_idx))
-                strings = line.xpath('.//alto:String', namespaces=ns) if 'alto' in ns else line.xpath('.//String')
-                if not strings:
-                    continue
+    # One batched call per source language instead of one request per line
+    lang_groups = {}
+    for idx, (_, _, _, lang) in enumerate(line_meta):
+        lang_groups.setdefault(lang, []).append(idx)
 
-                line_text = " ".join([s.get('CONTENT', '') for s in strings if s.get('CONTENT')]).strip()
-                if not line_text:
-                    continue
+    translations = [None] * len(line_meta)
+    for lang, indices in lang_groups.items():
+        translated = translator.translate_batch([line_meta[i][2] for i in indices], lang, tgt_lang)
+        for i, translated_text in zip(indices, translated):
+            translations[i] = translated_text
 
-                # Language Identification
-                actual_src_lang = src_lang
-                if src_lang == "auto" and identifier:
-                    detected_lang, _ = identifier.detect(line_text)
-                    actual_src_lang = detected_lang
+    # Pass 2: distribute the translated words back into the String elements
+    for (line_id, strings, line_text, _), translated_text in zip(line_meta, translations):
+        if csv_writer:
+            csv_rows.append([doc_name, page_idx, line_id, line_text, translated_text])
 
-                translated_text = translator.translate(line_text, actual_src_lang, tgt_lang)
+        trans_words = translated_text.split()
+        words_per_string, remainder = divmod(len(trans_words), len(strings))
 
-                if csv_writer:
-                    doc_name = input_path.name.split('.')[0]
-                    csv_writer.writerow([doc_name, page_idx, line_id, line_text, translated_text])
+        # Consume the token list through one iterator instead of slicing
+        # a fresh sub-list per String
+        word_iter = iter(trans_words)
+        for i, string_elem in enumerate(strings):
+            count = words_per_string + (1 if i < remainder else 0)
+            string_elem.set('CONTENT', " ".join(islice(word_iter, count)))
 
-                trans_words = translated_text.split()
-                num_strings = len(strings)
-                words_per_string = len(trans_words) // num_strings
-                remainder = len(trans_words) % num_strings
+    if csv_writer and csv_rows:
+        csv_writer.writerows(csv_rows)
+
+    if line_meta:
+        print()
+
+
+def process_alto_xml(input_path, output_path, translator, src_lang, tgt_lang, csv_writer=None, identifier=None):
+    """
+    Streams an ALTO document page by page: each Page subtree is translated as
+    soon as its end tag is parsed, written out incrementally, and freed.
+    Peak memory stays bounded by one page regardless of document size.
+    """
+    try:
+        doc_name = input_path.name.partition('.')[0]
+
+        context = etree.iterparse(str(input_path), events=('start', 'end'), huge_tree=True)
+        _, root = next(context)
+        nsmap = root.nsmap
+        ns = {'alto': nsmap[None]} if None in nsmap else nsmap
+        alto_uri = ns.get('alto')
+        layout_tag = f"{{{alto_uri}}}Layout" if alto_uri else 'Layout'
+        page_tag = f"{{{alto_uri}}}Page" if alto_uri else 'Page'
 
-                word_idx = 0
-                for i, string_elem in enumerate(strings):
-                    count = words_per_string + (1 if i < remainder else 0)
-                    assigned_words = trans_words[word_idx: word_idx + count]
-                    word_idx += count
-                    string_elem.set('CONTENT', " ".join(assigned_words))
+        page_idx = 0
+        with etree.xmlfile(str(output_path), encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xf.element(root.tag, attrib=root.attrib, nsmap=root.nsmap):
+                layout_ctx = None
+                depth = 1  # number of currently open elements
+                for event, elem in context:
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2 and elem.tag == layout_tag:
+                            # Mirror the Layout wrapper in the output stream
+                            layout_ctx = xf.element(elem.tag, attrib=elem.attrib)
+                            layout_ctx.__enter__()
+                        continue
 
-            if total_lines > 0:
-                print()
+                    if depth == 3 and layout_ctx is not None:
+                        if elem.tag == page_tag:
+                            page_idx += 1
+                            _translate_alto_page(elem, page_idx, ns, translator, src_lang, tgt_lang,
+                                                 csv_writer, identifier, doc_name)
+                        xf.write(elem)
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
+                    elif depth == 2:
+                        if elem.tag == layout_tag:
+                            layout_ctx.__exit__(None, None, None)
+                            layout_ctx = None
+                        else:
+                            # Description, Styles, Tags etc. pass through verbatim
+                            xf.write(elem)
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
+                    depth -= 1
 
-        tree.write(str(output_path), encoding='utf-8', xml_declaration=True)
         print(f"[SUCCESS] Saved ALTO translation to: {output_path}")
 
     except Exception as e: